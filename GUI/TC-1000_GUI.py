@@ -18,12 +18,18 @@ Code is in the public domain.
 """
 __author__ = 'Dirk Swart, Doudewijn Rempt, Jacob Hallen'
 
-import sys, time, datetime, math, threading, random, queue, glob, numpy as np
+import os, sys, time, threading, collections, numpy as np
 from PyQt5 import QtGui, QtCore, QtWidgets
-from datetime import datetime
+from matplotlib import style
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import serial
+from serial.tools import list_ports
+from hotpath import parsePacket, extendSamples
+
+# Cheaper rendering for the live plot: matplotlib's 'fast' style simplifies paths
+# aggressively and draws long lines in chunks
+style.use('fast')
 
 
 
@@ -31,51 +37,34 @@ def serial_ports():
     """
     Lists serial ports
 
-    :raises EnvironmentError:
-        On unsupported or unknown platforms
+    Uses the operating system's device list (the registry on Windows),
+    so no port has to be opened to find out whether it exists.
+    USB adapters, which the TC-1000 connects through, are listed first.
+
     :returns:
         A list of available serial ports
     """
-    if sys.platform.startswith('win'):
-        ports = ['COM' + str(i + 1) for i in range(1,256)] #exclude COM1
-
-    elif sys.platform.startswith('linux'):
-        # this is to exclude your current terminal "/dev/tty"
-        ports = glob.glob('/dev/tty[A-Za-z]*')
-
-    elif sys.platform.startswith('darwin'):
-        ports = glob.glob('/dev/tty.*')
-
-    else:
-        raise EnvironmentError('Unsupported platform')
-
-    result = []
-    for port in ports:
-        try:
-            s = serial.Serial(port)
-            s.close()
-            result.append(port)
-        except (OSError, serial.SerialException):
-            pass
-    return result
+    ports = [port for port in list_ports.comports() if port.device != "COM1"] #exclude COM1
+    ports.sort(key=lambda port: port.vid is None)
+    return [port.device for port in ports]
 
 def toFahrenheit(celsius):
     """
     Converts input to Fahrenheit scale.
 
     celsius
-        Input temperature in Celsius
+        Input temperature in Celsius: a number or a numpy array
     """
-    return (float(celsius)*9.0/5.0)+32.0
+    return celsius*1.8+32.0
 
 def toCelsius(fahrenheit):
     """
     Converts input to Celsius.
 
     fahrenheit
-        input temperature in Fahrenheit
+        input temperature in Fahrenheit: a number or a numpy array
     """
-    return (float(fahrenheit)-32.0)*(5.0/9.0)
+    return (fahrenheit-32.0)*(5.0/9.0)
 
 class MainWindow(QtWidgets.QMainWindow):
     """
@@ -93,7 +82,7 @@ class MainWindow(QtWidgets.QMainWindow):
             a function to be called when this window receives a CloseEvent
 
         stylesheet
-            a .stylesheet file opened in read mode contiang style information
+            string containing Qt style sheet information
 
         """
 
@@ -117,7 +106,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.endcommand = endcommand
 
-        self.setStyleSheet(stylesheet.read())
+        self.setStyleSheet(stylesheet)
 
     def initUI(self):
         """
@@ -130,6 +119,11 @@ class MainWindow(QtWidgets.QMainWindow):
         exitAction.setStatusTip('Exit application')
         exitAction.triggered.connect(self.closeEvent)
 
+        # File->Log to file
+        logAction = QtWidgets.QAction('&Log to file...', self)
+        logAction.setStatusTip('Append all temperature data to a CSV file')
+        logAction.triggered.connect(self.logEvent)
+
         # Graph->Reset
         resetAction = QtWidgets.QAction('&Reset plot', self)
         resetAction.setShortcut('Ctrl+R')
@@ -145,6 +139,7 @@ class MainWindow(QtWidgets.QMainWindow):
         # Initialize "File" Section of top menu
         menubar = self.menuBar()
         fileMenu = menubar.addMenu('&File')
+        fileMenu.addAction(logAction)
         fileMenu.addAction(exitAction)
         plotMenu = menubar.addMenu('&Plot')
         plotMenu.addAction(resetAction)
@@ -159,8 +154,18 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.endcommand()
 
+    def logEvent(self, ev):
+        """
+        Ask for a file and start logging temperature data to it.
+        """
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Log to file', '', 'CSV files (*.csv)')
+        if path:
+            self.monitor.startLog(path)
+            self.statusBar().showMessage("Logging to " + path)
+
     def plotResetEvent(self, ev):
         self.monitor.initializeTempArray()
+        self.plot.resetBackground()
 
 
 class SerialMonitor(QtWidgets.QWidget):
@@ -169,25 +174,26 @@ class SerialMonitor(QtWidgets.QWidget):
     Also allows graphical control of on-board variables.
 
     This widget DOES NOT handle actual I/O - this is handled by ThreadedClient, which acquires
-    data and passes it to the graphical monitor via a LifoQueue.
+    data and passes it to the graphical monitor via a bounded deque.
     """
 
-    def __init__(self, queue, endcommand, ports, *args):
+    # Number of most recent samples kept in memory. Older samples are dropped;
+    # use File->Log to file to keep a full record.
+    TEMP_WINDOW = 100000
+
+    def __init__(self, queue, endcommand, *args):
         """
         Constructor.
 
         queue
-            the input LifoQueue passed from the client application.
+            the input deque passed from the client application.
 
         endcommand
             the body of a funtion to be called at widget termination.
-
-        ports
-            A list of available serial ports
         """
 
         # Celsius default
-        self.fahrenheit = 0
+        self.fahrenheit = False
 
         # internal temperature trackers in celsius
         self.target = 30
@@ -202,10 +208,15 @@ class SerialMonitor(QtWidgets.QWidget):
         self.tempArrayInitialized = False
         self.currentInitialized = False
 
+        # value currently shown on the LCD
+        self.lastDisplayed = None
+
+        # open file receiving every sample, if logging
+        self.logFile = None
+
         # declare subwidgets
+        # (the port selector is filled by ThreadedClient once the background port search finishes)
         self.portSelector = QtWidgets.QComboBox(self)
-        for port in ports:
-            self.portSelector.addItem(port)
         self.portLabel = QtWidgets.QLabel(self)
         self.portLabel.setText("Serial Port")
         self.fSelect = QtWidgets.QRadioButton("Fahrenheit",self)
@@ -218,6 +229,8 @@ class SerialMonitor(QtWidgets.QWidget):
         self.currTemp = QtWidgets.QLCDNumber(6,self)
         self.targetTemp = QtWidgets.QSpinBox(self)
         self.targetTemp.setMaximum(1000)
+        # typed values only count once editing is done
+        self.targetTemp.setKeyboardTracking(False)
 
         # Create widget layout
         self.grid = QtWidgets.QGridLayout()
@@ -234,6 +247,19 @@ class SerialMonitor(QtWidgets.QWidget):
         self.show()
         self.endcommand = endcommand    
         
+    @property
+    def target(self):
+        """
+        Target temperature in Celsius.
+        """
+        return self._target
+
+    @target.setter
+    def target(self, celsius):
+        self._target = celsius
+        # Fahrenheit value kept alongside, since the spinbox compares against it on every step
+        self.targetF = toFahrenheit(celsius)
+
     def closeEvent(self, ev):
         """
         Executed when window is closed or File->Exit is called.
@@ -246,59 +272,187 @@ class SerialMonitor(QtWidgets.QWidget):
     def processIncoming(self):
         """
         Handle all the messages currently in the input queue (if any).
+
+        Every packet is recorded, but the widgets are only updated once,
+        from the state after the newest packet.
+
+        :Returns:
+            number of samples added to the temperature array
         """
-        while self.queue.qsize():
+        added = 0
+        batch = []
+        received = False
+        # most tokens in a packet: 2 and 3 carry the scale, 3 also the target
+        scalePacket = 0
+        while True:
             try:
-                #grab next item in queue
-                msg = self.queue.get(0).decode("utf-8").split()
-                #decode bytes to string and parse packet
-                if len(msg) == 1:
-                    self.current = float(msg[0])
-                    self.currentInitialized = True
-                elif len(msg) == 2:
-                    self.current =float(msg[0])
-                    self.fahrenheit = int(msg[1])
-                    self.currentInitialized = True
-                    if (int(self.fahrenheit)):
-                        self.fSelect.setChecked(True)
-                        self.targetTemp.setSuffix(" F")
-                        self.targetTemp.setValue(int(toFahrenheit(float(self.target))))
-                elif len(msg) == 3:
-                    self.current = float(msg[0])
-                    self.currentInitialized = True
-                    self.fahrenheit = int(msg[1])
-                    self.target = float(msg[2])
-                    if (int(self.fahrenheit)):
-                        self.fSelect.setChecked(True)
-                        self.targetTemp.setSuffix(" F")
-                        self.targetTemp.setValue(int(toFahrenheit(self.target)))
-                    else:
-                        self.cSelect.setChecked(True)
-                        self.targetTemp.setSuffix(" C")
-                        self.targetTemp.setValue(int(self.target))
-                
-                if int(self.fahrenheit):
-                    self.currTemp.display(toFahrenheit(self.current))
-                else:
-                    self.currTemp.display(self.current)
-
-                # add the temperature to array for analysis
-                if (self.tempArrayInitialized):
-                    arrayAdd = np.array([[time.time()-self.initTime, self.current,self.target]])
-                    self.tempArray = np.concatenate((self.tempArray,arrayAdd))
-                elif(self.currentInitialized):
-                    self.initializeTempArray()
-                    self.tempArrayInitialized = True
-                
-            except queue.Empty:
-                pass
+                #grab next item in queue and parse packet straight from bytes
+                count, current, scale, target = parsePacket(self.queue.popleft())
+            except IndexError:
+                break
+            if not count:
+                continue
+            received = True
+            self.current = current
+            self.currentInitialized = True
+            if count >= 2:
+                self.fahrenheit = bool(scale)
+                scalePacket = max(scalePacket, count)
+            if count == 3:
+                self.target = target
+
+            # collect the temperature for the array, which is written once below
+            if (self.tempArrayInitialized):
+                batch.append((time.time()-self.initTime, self.current, self.target))
+            elif(self.currentInitialized):
+                self.initializeTempArray()
+                self.tempArrayInitialized = True
+                added += 1
+
+        if not received:
+            return 0
+
+        if self.fahrenheit:
+            if scalePacket >= 2:
+                self.fSelect.setChecked(True)
+                self.targetTemp.setSuffix(" F")
+                self.setTargetValue(self.displayedTarget())
+            self.displayCurrent(toFahrenheit(self.current))
+        else:
+            if scalePacket == 3:
+                self.cSelect.setChecked(True)
+                self.targetTemp.setSuffix(" C")
+                self.setTargetValue(self.displayedTarget())
+            self.displayCurrent(self.current)
+
+        if batch:
+            self.appendTemps(batch)
+        return added + len(batch)
+
+    def displayCurrent(self, temp):
+        """
+        Show a temperature on the LCD, unless the shown value would not change.
+
+        temp
+            temperature in the selected scale, or "" to blank the display
+        """
+        if temp != "":
+            temp = round(temp, 2)
+        if temp != self.lastDisplayed:
+            self.currTemp.display(temp)
+            self.lastDisplayed = temp
+
+    def displayedTarget(self):
+        """
+        Return the target as shown in the spinbox: rounded to an integer in the selected scale.
+        """
+        if self.fahrenheit:
+            return int(round(self.targetF))
+        return int(round(self.target))
+
+    def setTargetValue(self, value):
+        """
+        Set the target spinbox without emitting valueChanged, so the GUI
+        updating itself is not mistaken for user input and sent back to the controller.
+
+        value
+            integer target temperature in the selected scale
+        """
+        self.targetTemp.blockSignals(True)
+        self.targetTemp.setValue(value)
+        self.targetTemp.blockSignals(False)
+
+    def toDisplayUnits(self, arr):
+        """
+        Convert an array of Celsius temperatures to the selected scale in one vectorized pass.
+
+        arr
+            numpy array of temperatures in Celsius
+        """
+        if self.fahrenheit:
+            return toFahrenheit(arr)
+        return arr
 
     def getTempArray(self):
-        return self.tempArray
+        """
+        Return a view of the recorded (time, current, target) samples still in memory.
+        """
+        return self.tempArray[:self.tempCount]
+
+    def getTempTail(self, window):
+        """
+        Return a view of the samples recorded within the last window seconds.
+
+        window
+            length of the time window in seconds
+        """
+        times = self.tempArray[:self.tempCount,0]
+        start = np.searchsorted(times, times[-1]-window)
+        return self.tempArray[start:self.tempCount]
 
     def initializeTempArray(self):
+        """
+        Start a new recording. Samples are stored in a preallocated array holding
+        up to 2*TEMP_WINDOW samples; when it is full, the last TEMP_WINDOW samples
+        are moved to the front, so memory is bounded and appending is amortized O(1).
+        """
         self.initTime = time.time()
-        self.tempArray = np.array([[time.time()-self.initTime, self.current, self.target]])
+        # column-major, so each of time, current and target is contiguous in memory,
+        # which is how the plot and the min/max reductions read them
+        self.tempArray = np.empty((2*self.TEMP_WINDOW,3), order='F')
+        self.tempArray[0] = (0, self.current, self.target)
+        self.tempCount = 1
+        if self.logFile is not None:
+            np.savetxt(self.logFile, self.tempArray[:1], fmt="%.3f", delimiter=",")
+        self.tempMin = float(min(self.current, self.target))
+        self.tempMax = float(max(self.current, self.target))
+
+    def appendTemps(self, batch):
+        """
+        Add samples to the temperature array with a single write.
+
+        batch
+            list of (time, current, target) tuples
+        """
+        batch = np.asarray(batch, dtype=float)[-self.TEMP_WINDOW:]
+        if self.logFile is not None:
+            np.savetxt(self.logFile, batch, fmt="%.3f", delimiter=",")
+
+        end = self.tempCount + len(batch)
+        if end > len(self.tempArray):
+            # drop the oldest samples
+            keep = self.TEMP_WINDOW - len(batch)
+            self.tempArray[:keep] = self.tempArray[self.tempCount-keep:self.tempCount]
+            self.tempCount = keep
+            temps = self.tempArray[:keep,1:]
+            self.tempMin = temps.min() if keep else np.inf
+            self.tempMax = temps.max() if keep else -np.inf
+        self.tempCount, self.tempMin, self.tempMax = extendSamples(
+            self.tempArray, self.tempCount, batch, self.tempMin, self.tempMax)
+
+    def getYRange(self):
+        """
+        Return (lowest, highest) temperature recorded so far, in Celsius.
+        """
+        return self.tempMin, self.tempMax
+
+    def startLog(self, path):
+        """
+        Append every following sample to a CSV file of time, current and target temperature (Celsius).
+
+        path
+            name of the log file
+        """
+        self.stopLog()
+        self.logFile = open(path,"a")
+
+    def stopLog(self):
+        """
+        Close the log file, if any.
+        """
+        if self.logFile is not None:
+            self.logFile.close()
+            self.logFile = None
 
     def setEnabled(self, enable):
         self.fSelect.setEnabled(enable)
@@ -315,48 +469,182 @@ class MplCanvasWidget(FigureCanvas):
     # Autoscroll x by default
     autoscroll = True
 
+    # Seconds of history kept in view when autoscrolling
+    SCROLL_WINDOW = 15
+
+    # Approximate number of points per line handed to matplotlib
+    TARGET_POINTS = 1200
+
+    # Axis limits are only updated once they move by more than this
+    XLIM_TOLERANCE = 5
+    YLIM_TOLERANCE = 2
+
     def __init__(self):
         self.fig = Figure()
         self.fig.suptitle("Temperature Control")
-        self.axes = self.fig.add_subplot(111,ylabel = "Temperature", xlabel = "Time")
-        FigureCanvas.__init__(self,self.fig) 
+        self.axes = self.fig.add_subplot(111,ylabel = "Temperature", xlabel = "Time (seconds)")
+        FigureCanvas.__init__(self,self.fig)
+
+        # Lines are created once and only their data is swapped out on each frame.
+        # They are animated, so full draws skip them and they are blitted on top
+        # of the cached background instead.
+        self.lineCurrent, = self.axes.plot([],[],'b',label = "Current",animated = True) # blue solid line
+        self.lineTarget, = self.axes.plot([],[],'r-',alpha = 0.6,label = "Target",animated = True) # faded red solid line, cheaper than dashed
+        self.axes.legend()
+
+        # Last applied axis limits
+        self.lastXlim = None
+        self.lastYlim = None
+
+        # Background (axes, ticks, legend) without the animated lines
+        self.background = None
+        self.mpl_connect('draw_event',self.cacheBackground)
+
+        self.fig.canvas.draw_idle()
         self.show()
 
-    def showPlot(self, x, yArray):
+    def cacheBackground(self, event):
+        """
+        Store the freshly drawn figure as the blitting background,
+        then paint the animated lines on top of it.
+
+        event
+            The matplotlib DrawEvent in question.
+        """
+        self.background = self.fig.canvas.copy_from_bbox(self.axes.bbox)
+        self.axes.draw_artist(self.lineCurrent)
+        self.axes.draw_artist(self.lineTarget)
+
+    def resetBackground(self):
+        """
+        Discard the cached background and schedule a full redraw, which re-caches it.
+        """
+        self.background = None
+        self.fig.canvas.draw_idle()
+
+    def resizeEvent(self, ev):
+        """
+        Executed when the canvas is resized. The cached background no longer fits.
+
+        ev
+            The ResizeEvent in question.
+        """
+        FigureCanvas.resizeEvent(self,ev)
+        self.resetBackground()
+
+    def decimate(self, x, y):
+        """
+        Reduce a line to about TARGET_POINTS points before plotting.
+
+        Samples are split into equal buckets and each bucket is replaced by its
+        minimum and maximum, in the order they occurred, so spikes stay visible
+        and falling segments are still drawn falling. The oldest samples are
+        dropped if they do not fill a whole bucket.
+
+        x
+            X data of the line
+
+        y
+            Y data of the line
+
+        :Returns:
+            tuple of decimated (x, y) data
+        """
+        n = len(x)
+        if n <= 2*self.TARGET_POINTS:
+            return x, y
+
+        stride = n // self.TARGET_POINTS
+        start = n % stride
+        xBuckets = x[start:].reshape(-1,stride)
+        yBuckets = y[start:].reshape(-1,stride)
+        rows = np.arange(len(yBuckets))
+        iMin = yBuckets.argmin(axis=1)
+        iMax = yBuckets.argmax(axis=1)
+        first = np.minimum(iMin,iMax)
+        last = np.maximum(iMin,iMax)
+        xOut = np.column_stack((xBuckets[rows,first],xBuckets[rows,last])).ravel()
+        yOut = np.column_stack((yBuckets[rows,first],yBuckets[rows,last])).ravel()
+        return xOut, yOut
+
+    def limitsClose(self, new, old, tolerance):
+        """
+        Check whether new axis limits are close enough to the applied ones to skip updating.
+
+        new
+            (lower, upper) tuple of wanted limits
+
+        old
+            (lower, upper) tuple of applied limits, or None if none were applied yet
+
+        tolerance
+            largest difference in either limit that is ignored
+        """
+        if old is None:
+            return False
+        return abs(new[0]-old[0]) < tolerance and abs(new[1]-old[1]) < tolerance
+
+    def showPlot(self, x, yArray, yRange = None):
         '''
         Fill plot with data and draw it on the screen.
 
+        Only the two lines are redrawn (blitted) unless the axis limits changed,
+        in which case the whole figure is redrawn.
+
         x
-            X data for plot (usually time)
+            X data for plot (usually time), in ascending order
 
         yArray
             array to hold plotted Y data. For TC-1000, this is current and target temp.
 
-        autoscroll
-            boolean value; true for autoscroll, false for autoscale.
+        yRange
+            (lowest, highest) value of the Y data, if already known. Computed from yArray otherwise.
         '''
 
-        self.axes.clear()
-        self.axes.set_ylabel("Temperature")
-        self.axes.set_xlabel("Time (seconds)")
+        self.lineCurrent.set_data(*self.decimate(x,yArray[0]))
+        self.lineTarget.set_data(*self.decimate(x,yArray[1]))
 
-        # rudimentary auto-scaling
-        self.axes.set_ylim([np.amin(yArray)-5,np.amax(yArray)+5])
+        limitsChanged = False
 
+        # rudimentary auto-scaling
+        if yRange is None:
+            yRange = (np.min(yArray),np.max(yArray))
+        ylim = (yRange[0]-5,yRange[1]+5)
+        if not self.limitsClose(ylim,self.lastYlim,self.YLIM_TOLERANCE):
+            self.axes.set_ylim(ylim)
+            self.lastYlim = ylim
+            limitsChanged = True
+
+        # x is sorted, so its ends are its extremes
+        highestX = x[-1]
         if(self.autoscroll):
-            highestX = np.amax(x)
-            if highestX < 15:
-                self.axes.set_xlim([0,30])
+            if highestX < self.SCROLL_WINDOW:
+                xlim = (0,2*self.SCROLL_WINDOW)
             else:
-                self.axes.set_xlim([highestX-15,highestX+15])
-
-        self.axes.plot(x,yArray[0],'b',label = "Current") # plot first argument as blue solid line
-        self.axes.plot(x,yArray[1],'r--', label = "Target") # plot second argument as red dashed line
-        self.axes.legend()
-        self.fig.canvas.draw()
+                xlim = (highestX-self.SCROLL_WINDOW,highestX+self.SCROLL_WINDOW)
+        else:
+            # show everything, leaving room for samples until the next update
+            xlim = (x[0],highestX+self.XLIM_TOLERANCE)
+        if not self.limitsClose(xlim,self.lastXlim,self.XLIM_TOLERANCE):
+            self.axes.set_xlim(xlim)
+            self.lastXlim = xlim
+            limitsChanged = True
+
+        if limitsChanged or self.background is None:
+            # ticks changed, so the background has to be rebuilt. Let Qt coalesce
+            # this with any other pending redraw; blitting resumes once it lands.
+            self.background = None
+            self.fig.canvas.draw_idle()
+            return
+
+        self.fig.canvas.restore_region(self.background)
+        self.axes.draw_artist(self.lineCurrent)
+        self.axes.draw_artist(self.lineTarget)
+        self.fig.canvas.blit(self.axes.bbox)
 
     def setAutoScroll(self, scroll):
         self.autoscroll = scroll
+        self.lastXlim = None
 
 class PlotControlWidget(QtWidgets.QWidget):
     """
@@ -374,13 +662,18 @@ class PlotControlWidget(QtWidgets.QWidget):
         self.resetButton = QtWidgets.QPushButton("Reset Plot", self)
         self.scrollCheck = QtWidgets.QCheckBox("autoscroll",self)
         self.scrollCheck.setChecked(True)
-        self.widgets = [self.controlLabel,self.resetButton,self.scrollCheck]
+        self.renderLabel = QtWidgets.QLabel("Plot every N ticks",self)
+        self.renderSpin = QtWidgets.QSpinBox(self)
+        self.renderSpin.setRange(1,20)
+        self.widgets = [self.controlLabel,self.resetButton,self.scrollCheck,self.renderLabel,self.renderSpin]
 
         self.grid = QtWidgets.QGridLayout(self)
 
         self.grid.addWidget(self.controlLabel,0,0,1,2)
         self.grid.addWidget(self.resetButton,1,0)
         self.grid.addWidget(self.scrollCheck,1,1)
+        self.grid.addWidget(self.renderLabel,2,0)
+        self.grid.addWidget(self.renderSpin,2,1)
 
         self.setLayout(self.grid)
         self.show()
@@ -394,36 +687,107 @@ class PlotControlWidget(QtWidgets.QWidget):
                 widget.setEnabled(enabled)
 
 
+class SerialSignals(QtCore.QObject):
+    """
+    Signals emitted by the I/O thread. Connected slots run in the GUI thread.
+    """
+
+    # new input has been placed in the input queue
+    dataReady = QtCore.pyqtSignal()
+
+    # a port search finished; carries the list of available ports
+    portsChanged = QtCore.pyqtSignal(list)
+
+    # the serial connection failed; carries the port name
+    connectionLost = QtCore.pyqtSignal(str)
+
+    # message for the status bar
+    status = QtCore.pyqtSignal(str)
+
+
+class PortProbe(QtCore.QRunnable):
+    """
+    Searches for serial ports in a QThreadPool worker, so the GUI never waits on it.
+    """
+
+    def __init__(self, signals):
+        """
+        Constructor.
+
+        signals
+            SerialSignals instance used to report the result
+        """
+        QtCore.QRunnable.__init__(self)
+        self.signals = signals
+
+    def run(self):
+        self.signals.portsChanged.emit(serial_ports())
+
+
 class ThreadedClient:
     """
     Launches the GUI and handles I/O.
 
-    GUI components reside within the body of the class itself, while actual serial communication
-    is in a separate thread.
+    GUI components reside within the body of the class itself. Serial communication is driven
+    by a QSocketNotifier in the GUI thread where possible, and by a separate thread otherwise.
     """
     BAUD_RATE = 9600
+    QUEUE_SIZE = 256
+
+    # Encoded scale change commands
+    CMD_F = b"F\n"
+    CMD_C = b"C\n"
     running = 0
-    serialPort = 0
     ssFile = "SerialMonitor.stylesheet"
-    ports = serial_ports()
-    if(ports):
-        serialPort = ports[0]
+
+    # Minimum number of seconds between two searches for serial ports
+    PROBE_INTERVAL = 2
+
+    # Redraw the plot at most every N timer ticks
+    renderEvery = 5
+
+    # Milliseconds the target spinbox has to be still before its value is sent
+    WRITE_DELAY = 80
 
     def __init__(self):
         """
         Constructor.
         """
 
-        # Create the queues
+        # Serial ports are searched for in the background once the GUI is up
+        self.ports = []
+        self.ser = None
+        self.notifier = None
+        self.thread1 = None
+        self.readBuffer = bytearray()
+        self.probing = False
+        self.portsProbedAt = time.monotonic() - self.PROBE_INTERVAL
+
+        # Debounces spinbox changes; see queueWrite
+        self.pendingTarget = 0
+        self.writeTimer = QtCore.QTimer()
+        self.writeTimer.setSingleShot(True)
+        self.writeTimer.setInterval(self.WRITE_DELAY)
+
+        # Plot throttling: timer tick counter, and whether new samples await plotting
+        self.tick = 0
+        self.plotDirty = False
+
+        # Create the queues. Appending and popping are atomic on a deque,
+        # and a full deque drops its oldest entry.
         self.outVal = 0
-        self.inQueue = queue.LifoQueue()
-        self.outQueue = queue.LifoQueue()
+        self.inQueue = collections.deque(maxlen=self.QUEUE_SIZE)
+        self.outQueue = collections.deque(maxlen=self.QUEUE_SIZE)
+
+        # Signals from the I/O thread, delivered in the GUI thread
+        self.signals = SerialSignals()
 
         # load stylesheet
-        self.ss = open(self.ssFile,"r")
+        with open(self.ssFile,"r") as ssFile:
+            self.ss = ssFile.read()
 
         # Set up subwidgets
-        self.monitor=SerialMonitor(self.inQueue, self.endWidget,self.ports)
+        self.monitor=SerialMonitor(self.inQueue, self.endWidget)
         self.widgets = [self.monitor]
 
         #initialize graphing utility
@@ -432,20 +796,17 @@ class ThreadedClient:
 
         # Intialize plot controls
         self.plotControl = PlotControlWidget()
+        self.plotControl.renderSpin.setValue(self.renderEvery)
         self.widgets.append(self.plotControl)
 
         # disable controls during startup
         self.controlsEnabled(False)
 
-        # Start Serial Connection
-        if self.serialPort:
-            self.initSerial(self.serialPort,self.BAUD_RATE)
-
         # Create GUI from widgets
         self.gui = MainWindow(self.widgets,self.endApplication,self.ss)
         self.gui.show()
 
-        # A timer to periodically call periodicCall
+        # A timer to periodically redraw the plot
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.periodicCall)
 
@@ -454,18 +815,28 @@ class ThreadedClient:
 
         self.connectSignals()
 
-        # Set up the thread to do asynchronous I/O
+        # Serial I/O is set up by initSerial once a port is connected
         self.running = 1
-        self.thread1 = threading.Thread(target=self.workerThread1)
-        self.thread1.start()
+
+        # Look for serial ports once the window has been painted
+        QtCore.QTimer.singleShot(0,self.probePorts)
 
     def connectSignals(self):
         """
         Connect signals emitted by subwidgets to correct slots.
         """
 
-        # Connect spinbox to target temp on Arduino
-        self.monitor.targetTemp.valueChanged.connect(self.writeData)
+        # Handle incoming data as soon as the I/O thread queues it
+        self.signals.dataReady.connect(self.readIncoming)
+
+        # Handle results of port searches and lost connections
+        self.signals.portsChanged.connect(self.updatePorts)
+        self.signals.connectionLost.connect(self.connectionLost)
+        self.signals.status.connect(self.gui.statusBar().showMessage)
+
+        # Connect spinbox to target temp on Arduino, through the write timer
+        self.monitor.targetTemp.valueChanged.connect(self.queueWrite)
+        self.writeTimer.timeout.connect(self.writePending)
 
         # Connect port selector
         self.monitor.portSelector.currentIndexChanged.connect(self.changePort)
@@ -475,24 +846,117 @@ class ThreadedClient:
 
         # connect reset button to plot
         self.plotControl.resetButton.clicked.connect(self.monitor.initializeTempArray)
+        self.plotControl.resetButton.clicked.connect(self.plot.resetBackground)
 
         # Connect autoscroll checkbox
         self.plotControl.scrollCheck.stateChanged.connect(self.plot.setAutoScroll)
 
+        # Connect plot rate spinbox
+        self.plotControl.renderSpin.valueChanged.connect(self.setRenderEvery)
+
+
+    def readIncoming(self):
+        """
+        Executed in the GUI thread whenever the I/O thread has queued new input.
+        """
+        if self.monitor.processIncoming():
+            self.plotDirty = True
 
     def periodicCall(self):
         """
-        Check every 50 ms if there is something new in the queue.
+        Called every 50 ms to redraw the plot.
+        The plot is only redrawn every renderEvery ticks, and only if new samples arrived.
         Also checks whether the program has closed.
         """
-        self.monitor.processIncoming()
-        if(self.monitor.tempArrayInitialized): #Check initialization of temperature acquisition
-            tArray = self.monitor.getTempArray()
-            if(tArray.any()):
-                self.plot.showPlot(tArray[:,0],[tArray[:,1],tArray[:,2]])
-            if not self.running:
-                root.quit()
-                print("Quit")
+        self.tick += 1
+        if(self.monitor.tempArrayInitialized and self.plotDirty and self.tick % self.renderEvery == 0):
+            self.plotDirty = False
+            # when autoscrolling, only the visible part of the plot is needed
+            if(self.plot.autoscroll):
+                tArray = self.monitor.getTempTail(self.plot.SCROLL_WINDOW+self.plot.XLIM_TOLERANCE)
+            else:
+                tArray = self.monitor.getTempArray()
+            if(len(tArray)):
+                temps = self.monitor.toDisplayUnits(tArray[:,1:])
+                yRange = self.monitor.toDisplayUnits(np.array(self.monitor.getYRange()))
+                self.plot.showPlot(tArray[:,0],[temps[:,0],temps[:,1]],yRange)
+        if not self.running:
+            root.quit()
+            print("Quit")
+
+    def probePorts(self):
+        """
+        Start a background search for serial ports.
+        Searches are spaced at least PROBE_INTERVAL seconds apart; results arrive in updatePorts.
+        """
+        if self.probing or not self.running:
+            return
+        self.probing = True
+        wait = max(0, self.portsProbedAt + self.PROBE_INTERVAL - time.monotonic())
+        QtCore.QTimer.singleShot(int(wait*1000),self.startProbe)
+
+    def startProbe(self):
+        """
+        Hand a PortProbe to the global thread pool.
+        """
+        QtCore.QThreadPool.globalInstance().start(PortProbe(self.signals))
+
+    def updatePorts(self, ports):
+        """
+        Executed in the GUI thread when a port search finishes.
+        Connects to the first port that opens if not connected yet, otherwise searches again later.
+
+        ports
+            list of available serial ports
+        """
+        self.probing = False
+        self.portsProbedAt = time.monotonic()
+        self.ports = ports
+
+        selector = self.monitor.portSelector
+        selector.blockSignals(True)
+        selector.clear()
+        selector.addItems(ports)
+        if self.ser is not None and self.ser.port in ports:
+            selector.setCurrentIndex(ports.index(self.ser.port))
+        selector.blockSignals(False)
+
+        if not ports:
+            self.controlsEnabled(False)
+            self.gui.statusBar().showMessage("No Serial Ports Detected")
+            self.probePorts()
+        elif self.ser is None:
+            # ports held by another program fail to open; try the next one
+            for port in ports:
+                self.gui.statusBar().showMessage("Connecting to " + port + "...")
+                if self.initSerial(port,self.BAUD_RATE):
+                    selector.blockSignals(True)
+                    selector.setCurrentIndex(ports.index(port))
+                    selector.blockSignals(False)
+                    break
+            else:
+                self.probePorts()
+
+    def connectionLost(self, port):
+        """
+        Executed in the GUI thread when the I/O thread loses the serial connection.
+
+        port
+            name of the port that failed
+        """
+        self.gui.statusBar().showMessage("Error on " + port)
+        self.monitor.displayCurrent("")
+        self.controlsEnabled(False)
+        self.probePorts()
+
+    def setRenderEvery(self, ticks):
+        """
+        Set how often the plot is redrawn.
+
+        ticks
+            number of 50 ms timer ticks between plot redraws
+        """
+        self.renderEvery = ticks
 
     def initSerial(self,port,baud = BAUD_RATE):
         """
@@ -510,33 +974,120 @@ class ThreadedClient:
 
         try:
             self.ser = serial.Serial(port, baud)
-            self.controlsEnabled(True)
-            return True
         except (OSError,serial.SerialException):
-            pass
+            return False
+
+        try:
+            self.setLowLatency()
+            self.readBuffer = bytearray()
+            self.watchSerial()
+        except (OSError,serial.SerialException):
+            # don't leave a half set up port open
+            self.closeSerial()
+            return False
+
+        self.controlsEnabled(True)
+        return True
+
+    def queueWrite(self, data):
+        """
+        Remember the latest spinbox value and (re)start the write timer,
+        so a burst of spinbox changes results in a single writeData call.
+
+        data
+            new value of spinbox.
+        """
+        self.pendingTarget = data
+        self.writeTimer.start()
+
+    def writePending(self):
+        """
+        Executed when the spinbox has been still for WRITE_DELAY ms.
+        """
+        self.writeData(self.pendingTarget)
+
+    def watchSerial(self):
+        """
+        Arrange for incoming serial data to be read.
+
+        On POSIX (Linux, Mac) the port is a file descriptor, so a QSocketNotifier wakes the GUI thread
+        as soon as data arrives, and all serial I/O happens there in serialReadable.
+        On Windows pyserial has no descriptor and QSocketNotifier only accepts sockets,
+        so workerThread1 is started to do the I/O.
+        """
+        if os.name == "posix":
+            self.notifier = QtCore.QSocketNotifier(self.ser.fileno(), QtCore.QSocketNotifier.Read)
+            self.notifier.activated.connect(self.serialReadable)
+        elif self.thread1 is None:
+            self.thread1 = threading.Thread(target=self.workerThread1)
+            self.thread1.start()
+
+    def serialReadable(self, fd):
+        """
+        Executed in the GUI thread when the serial port has data to read.
+        Reads and processes it, then sends any pending output.
+
+        fd
+            file descriptor of the serial port
+        """
+        if self.ser is None:
+            return
+        try:
+            msgsIn = self.readSerial(self.ser)
+            if (msgsIn):
+                self.gui.statusBar().showMessage("Serial connection active")
+                self.inQueue.extend(msgsIn)
+                self.readIncoming()
+            self.flushOutput(self.ser)
+        except (OSError,serial.SerialException):
+            port = self.ser.port
+            self.closeSerial()
+            self.connectionLost(port)
+
+    def closeSerial(self):
+        """
+        Stop watching and close the serial port, if one is open.
+        """
+        if self.notifier is not None:
+            self.notifier.setEnabled(False)
+            self.notifier.deleteLater()
+            self.notifier = None
+        if self.ser is not None:
+            self.ser.close()
+            self.ser = None
 
-        return False
+    def setLowLatency(self):
+        """
+        Ask the driver to hand received bytes over immediately.
+        USB serial adapters on Linux otherwise hold them back for up to 16 ms.
+        Needs pyserial 3.5 or newer on Linux. Elsewhere pyserial either lacks the call
+        or raises NotImplementedError, and the port is left as it is.
+        """
+        if hasattr(self.ser, "set_low_latency_mode"):
+            try:
+                self.ser.set_low_latency_mode(True)
+            except (OSError,ValueError,NotImplementedError):
+                # not supported by this driver or platform
+                pass
 
     def writeData(self, data):
         """
         Implement spinbox control of temperature variables.
         Write target temperature value from spinbox to output queue.
 
+        Spinbox changes are debounced, so data may be several steps away from the current target.
+
         data
             new value of spinbox.
         """
-        if not self.monitor.fahrenheit:
-            if(data > self.monitor.target):
-                self.monitor.target += 1
-            elif(data < self.monitor.target):
-                self.monitor.target -= 1
-        else:
-            if(data > toFahrenheit(self.monitor.target)):
-                self.monitor.target += 5.0/9.0
-            elif(data < toFahrenheit(self.monitor.target)):
-                self.monitor.target -= 5.0/9.0
+        # the spinbox shows the target rounded to an integer; only act if the user changed it
+        if(data != self.monitor.displayedTarget()):
+            if self.monitor.fahrenheit:
+                self.monitor.target = toCelsius(data)
+            else:
+                self.monitor.target = float(data)
 
-        self.outQueue.put(self.monitor.target)
+        self.outQueue.append(self.monitor.target)
 
     def scaleChange(self, scale):
         """
@@ -546,18 +1097,18 @@ class ThreadedClient:
         scale
             Boolean value: True for Fahrenheit, False for Celsius
         """
+        # the target itself is kept unrounded, so toggling the scale does not move it
         self.monitor.fahrenheit = scale
-        self.monitor.target = math.floor(self.monitor.target)
         if(scale):
-            self.outQueue.put("F")
-            self.monitor.currTemp.display(toFahrenheit(self.monitor.current))
+            self.outQueue.append(self.CMD_F)
+            self.monitor.displayCurrent(toFahrenheit(self.monitor.current))
             self.monitor.targetTemp.setSuffix(" F")
-            self.monitor.targetTemp.setValue(int(toFahrenheit(self.monitor.target)))
+            self.monitor.setTargetValue(self.monitor.displayedTarget())
         else:
-            self.monitor.currTemp.display(float(self.monitor.current))
-            self.monitor.targetTemp.setValue(float(self.monitor.target))
+            self.monitor.displayCurrent(self.monitor.current)
+            self.monitor.setTargetValue(self.monitor.displayedTarget())
             self.monitor.targetTemp.setSuffix(" C")
-            self.outQueue.put("C")
+            self.outQueue.append(self.CMD_C)
 
     def endWidget(self):
         """
@@ -565,8 +1116,9 @@ class ThreadedClient:
         """
         print("Closing widget...")
         self.running = 0
+        self.monitor.stopLog()
         # close serial connection - exit hangs if this fails
-        self.ser.close()
+        self.closeSerial()
         print("Serial closed...")
 
     def endApplication(self):
@@ -594,59 +1146,108 @@ class ThreadedClient:
         portIndex
             index into ports list corresponding to desired port
         """
-        try:
-            self.ser.close()
-            self.initSerial(self.ports[portIndex],BAUD_RATE)
-            self.ser.open()
-        except:
-            self.gui.statusBar().showMessage("Error on " + self.ports[portIndex])
-            pass
+        if not 0 <= portIndex < len(self.ports):
+            return
+        newPort = self.ports[portIndex]
+        if self.ser is not None and self.ser.port == newPort and self.ser.is_open:
+            return
+
+        self.closeSerial()
+        # initSerial opens the port as well
+        if not self.initSerial(newPort,self.BAUD_RATE):
+            self.gui.statusBar().showMessage("Error on " + newPort)
+
+    def readSerial(self, ser):
+        """
+        Read everything the serial port has buffered, waiting for one byte if nothing is.
+
+        ser
+            open serial port to read from
+
+        :Returns:
+            list of complete lines received, without the newline.
+            A trailing partial line is kept for the next call.
+        """
+        waiting = ser.in_waiting
+        if waiting:
+            self.readBuffer += ser.read(waiting)
+        else:
+            # wait for the first byte, then take whatever arrived along with it
+            self.readBuffer += ser.read(1)
+            self.readBuffer += ser.read(ser.in_waiting)
+        lines = self.readBuffer.split(b"\n")
+        self.readBuffer = lines.pop()
+        return lines
+
+    def flushOutput(self, ser):
+        """
+        Drain the output queue and push only the newest scale and target to serial,
+        as anything older is already stale.
+
+        ser
+            open serial port to write to
+        """
+        scale = None
+        target = None
+        while True:
+            try:
+                item = self.outQueue.popleft()
+            except IndexError:
+                break
+            if isinstance(item, bytes):
+                # scale change commands are queued ready to send
+                scale = item
+            else:
+                target = item
+        msgOut = b""
+        if scale is not None:
+            msgOut += scale
+        if target is not None:
+            self.outVal = target
+            msgOut += (str(target) + "\n").encode("utf-8")
+        if msgOut:
+            ser.write(msgOut)
 
     def workerThread1(self):
         """
-        Handles asynchronous I/O.
+        Handles asynchronous I/O on Windows, where ports have no file descriptor.
 
-        Pulls raw port input in line by line and places it in a queue which is passed to the SerialMonitor widget.
+        Pulls raw port input in, as many bytes as are available at a time, and places complete lines
+        in a queue which is passed to the SerialMonitor widget,
+        then signals the GUI thread to process it.
+        Widgets are never touched from this thread; everything goes through SerialSignals.
         Output from SerialMonitor subwidget is placed in the output queue by various methods above,
-        and each time through the loop, the most recent output is encoded and sent to the control module.
+        and each time through the loop, the most recent scale and target are encoded and sent to the control module.
         """
         while self.running:
-            # If no port is available, continuously check for one
-            while (not self.ports) and self.running:
-                self.controlsEnabled(False)
-                self.gui.statusBar().showMessage("No Serial Ports Detected")
-                self.monitor.portSelector.clear()
-                self.ports = serial_ports()
-                # if found
-                if(self.ports):
-                    self.controlsEnabled(True)
-                    self.gui.statusBar().showMessage("Connecting to " + self.ports[0] + "...")
-                    self.monitor.portSelector.addItem(self.ports[0])
-                    self.initSerial(self.ports[0],self.BAUD_RATE)
-                    time.sleep(.5)
-
-            while self.ports and self.running:
-                #Poll serial for input and enqueue it
+            # The GUI thread may close or replace the port at any time (changePort),
+            # so work on the port as it was at the start of this pass
+            ser = self.ser
+
+            # Wait until the GUI thread has found a port and connected to it
+            if ser is None:
+                time.sleep(.5)
+                continue
+
+            #Poll serial for input and enqueue it
+            try:
+                msgsIn = self.readSerial(ser)
+                if (msgsIn):
+                    self.signals.status.emit("Serial connection active")
+                    self.inQueue.extend(msgsIn)
+                    self.signals.dataReady.emit()
+                self.flushOutput(ser)
+            except (OSError,serial.SerialException):
+                if ser is not self.ser:
+                    # closed by the GUI thread, not lost
+                    continue
                 try:
-                    msgIn = self.ser.readline();
-                    if (msgIn):
-                        self.gui.statusBar().showMessage("Serial connection active")
-                        self.inQueue.put(msgIn)
-                    else:
-                        pass
-                except serial.serialutil.SerialException:
-                    try:
-                        self.ser.readline()
-                    except serial.serialutil.SerialException:
-                        self.gui.statusBar().showMessage("Error on " + self.ports[0])
-                        self.monitor.currTemp.display("")
-                        self.ports = []
-
-                # push next available output from queue to serial
-                if self.outQueue.qsize():
-                    self.outVal = self.outQueue.get()
-                    self.ser.write(str(self.outVal).encode("utf-8"))
-                    self.ser.write('\n'.encode("utf-8"))
+                    self.readSerial(ser)
+                except (OSError,serial.SerialException):
+                    if ser is self.ser:
+                        self.ser = None
+                        ser.close()
+                        self.signals.connectionLost.emit(ser.port)
 
 
 
@@ -0,0 +1,97 @@
+"""
+================
+TC-1000 GUI hot path
+================
+
+Per-packet work of the TC-1000 GUI: parsing serial packets and storing
+temperature samples.
+
+If Numba is installed, storing samples is compiled to machine code, which
+keeps up with much higher packet rates than the 1 Hz-ish TC-1000 firmware.
+It is compiled when this module is imported, before the GUI starts, so the
+first samples do not stall the GUI thread. Otherwise an equivalent NumPy
+version is used.
+"""
+
+import re, numpy as np
+
+try:
+    from numba import njit, types
+except ImportError:
+    njit = None
+
+
+# Serial packet: current temperature, optionally followed by scale flag and target temperature.
+# ASCII only, so it is matched on the raw bytes without decoding.
+PACKET_RE = re.compile(rb"^\s*(-?\d+(?:\.\d+)?)(?:\s+(\d+))?(?:\s+(-?\d+(?:\.\d+)?))?\s*$")
+
+
+def parsePacket(buf):
+    """
+    Parse a serial packet of up to three numbers.
+
+    Packets are a few bytes long, so a precompiled regex beats calling into
+    compiled code once per packet.
+
+    buf
+        bytes of one packet, e.g. b"23.45 1 30.00\\r\\n"
+
+    :Returns:
+        (number of values, value 1, value 2, value 3). Missing values are NaN;
+        the count is 0 if the packet is malformed.
+    """
+    match = PACKET_RE.match(buf)
+    if not match:
+        return 0, np.nan, np.nan, np.nan
+    current, scale, target = match.groups()
+    if scale is None:
+        return 1, float(current), np.nan, np.nan
+    if target is None:
+        return 2, float(current), float(scale), np.nan
+    return 3, float(current), float(scale), float(target)
+
+def _extendSamplesLoop(arr, n, batch, ymin, ymax):
+    """
+    Copy rows into a preallocated sample array and update the temperature range.
+    Loop version, for Numba.
+
+    arr
+        (capacity, 3) column-major float array of (time, current, target) samples
+
+    n
+        number of rows of arr already filled. There must be room for batch after them.
+
+    batch
+        (k, 3) row-major float array of new samples
+
+    ymin, ymax
+        lowest and highest temperature before the batch
+
+    :Returns:
+        (new number of filled rows, new ymin, new ymax)
+    """
+    for i in range(batch.shape[0]):
+        for j in range(3):
+            arr[n+i,j] = batch[i,j]
+        ymin = min(ymin, batch[i,1], batch[i,2])
+        ymax = max(ymax, batch[i,1], batch[i,2])
+    return n + batch.shape[0], ymin, ymax
+
+def _extendSamplesNumpy(arr, n, batch, ymin, ymax):
+    """
+    NumPy version of _extendSamplesLoop, used without Numba.
+    """
+    end = n + len(batch)
+    arr[n:end] = batch
+    temps = batch[:,1:]
+    return end, min(ymin, temps.min()), max(ymax, temps.max())
+
+
+if njit is not None:
+    # An explicit signature compiles right away rather than on the first call.
+    # It has to match the arrays SerialMonitor passes in exactly.
+    extendSamples = njit(types.Tuple((types.int64, types.float64, types.float64))(
+        types.float64[::1,:], types.int64, types.float64[:,::1], types.float64, types.float64))(
+        _extendSamplesLoop)
+else:
+    extendSamples = _extendSamplesNumpy